@@ -14,7 +14,7 @@ use types::PcbData;
 /// Prevents ZIP/tar bomb attacks where a small compressed file expands to exhaust memory.
 pub const MAX_DECOMPRESSED_BYTES: u64 = 500 * 1024 * 1024;
 
-#[derive(Debug, Clone, Copy, PartialEq, Eq, Serialize, Deserialize)]
+#[derive(Debug, Clone, Copy, PartialEq, Eq, Hash, Serialize, Deserialize)]
 #[serde(rename_all = "snake_case")]
 pub enum PcbFormat {
     KiCad,
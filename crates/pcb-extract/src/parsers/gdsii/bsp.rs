@@ -134,6 +134,28 @@ impl BspIndex {
         }
     }
 
+    /// Approximate bytes this index occupies in memory: the node arena and
+    /// leaf id lists plus every record. Much larger than [`Self::to_bytes`],
+    /// which varint-encodes all of it.
+    pub fn decoded_size(&self) -> usize {
+        let leaf_ids: usize = self
+            .nodes
+            .iter()
+            .map(|node| match node {
+                BspNode::Leaf { record_ids } => record_ids.len() * std::mem::size_of::<u32>(),
+                BspNode::Split { .. } => 0,
+            })
+            .sum();
+        std::mem::size_of::<Self>()
+            + self.nodes.len() * std::mem::size_of::<BspNode>()
+            + leaf_ids
+            + self
+                .records
+                .iter()
+                .map(PlacedRecord::decoded_size)
+                .sum::<usize>()
+    }
+
     /// Serialize to a compact binary blob (for `gdsii/{id}/index.bin`).
     pub fn to_bytes(&self) -> Result<Vec<u8>, postcard::Error> {
         postcard::to_allocvec(self)
@@ -357,6 +379,14 @@ mod tests {
         assert_eq!(idx.len(), back.len());
     }
 
+    #[test]
+    fn decoded_size_covers_records_and_outweighs_serialized_size() {
+        let recs = sample();
+        let idx = BspIndex::build(recs.clone());
+        assert!(idx.decoded_size() >= recs.len() * std::mem::size_of::<PlacedRecord>());
+        assert!(idx.decoded_size() > idx.to_bytes().unwrap().len());
+    }
+
     #[test]
     fn all_straddlers_still_terminates_and_is_correct() {
         // 500 boxes that all span the whole field — the split can't separate
@@ -124,6 +124,23 @@ pub struct PlacedRecord {
     pub geom: Geom,
 }
 
+impl PlacedRecord {
+    /// Approximate bytes this record occupies in memory: the struct itself
+    /// plus its geometry's heap allocations.
+    pub fn decoded_size(&self) -> usize {
+        let point = std::mem::size_of::<[i64; 2]>();
+        let heap = match &self.geom {
+            Geom::Poly { rings } => rings
+                .iter()
+                .map(|ring| std::mem::size_of::<Vec<[i64; 2]>>() + ring.len() * point)
+                .sum(),
+            Geom::Path { pts, .. } => pts.len() * point,
+            Geom::Label { text, .. } => text.len(),
+        };
+        std::mem::size_of::<Self>() + heap
+    }
+}
+
 /// Result of streaming a GDSII file: the placed records plus the world unit.
 #[derive(Debug, Clone)]
 pub struct RecordStream {
@@ -156,6 +173,17 @@ pub struct InstancedArray {
 }
 
 impl InstancedArray {
+    /// Approximate bytes this array occupies in memory. Instances are never
+    /// stored, so only the child geometry counts.
+    pub fn decoded_size(&self) -> usize {
+        std::mem::size_of::<Self>()
+            + self
+                .child
+                .iter()
+                .map(PlacedRecord::decoded_size)
+                .sum::<usize>()
+    }
+
     /// Materialize the instances whose geometry intersects `tile`.
     pub fn expand_for_tile(&self, tile: &WorldBox) -> Vec<PlacedRecord> {
         let mut out = Vec::new();
@@ -99,6 +99,17 @@ pub struct TileIndex {
 }
 
 impl TileIndex {
+    /// Approximate bytes this index occupies once decoded, for budgeting
+    /// caches of decoded indexes.
+    pub fn decoded_size(&self) -> usize {
+        self.bsp.decoded_size()
+            + self
+                .arrays
+                .iter()
+                .map(InstancedArray::decoded_size)
+                .sum::<usize>()
+    }
+
     pub fn to_bytes(&self) -> Result<Vec<u8>, postcard::Error> {
         postcard::to_allocvec(self)
     }
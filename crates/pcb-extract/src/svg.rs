@@ -12,16 +12,20 @@ use crate::types::BBox;
 /// Points are emitted as given (apply any rotation/offset before calling).
 pub fn polyline_to_d(pts: &[[f64; 2]]) -> String {
     let mut d = String::with_capacity(pts.len() * 18);
-    for (i, p) in pts.iter().enumerate() {
-        if i == 0 {
-            let _ = write!(d, "M{:.4} {:.4}", p[0], p[1]);
-        } else {
-            let _ = write!(d, "L{:.4} {:.4}", p[0], p[1]);
-        }
-    }
+    write_polyline(&mut d, pts.iter().copied());
     d
 }
 
+/// Append an open polyline `d`-string to `out` (same format as
+/// [`polyline_to_d`]). Takes an iterator so callers can transform points on
+/// the fly and write straight into the document buffer without allocating.
+pub fn write_polyline(out: &mut String, pts: impl IntoIterator<Item = [f64; 2]>) {
+    for (i, p) in pts.into_iter().enumerate() {
+        let cmd = if i == 0 { 'M' } else { 'L' };
+        let _ = write!(out, "{cmd}{:.4} {:.4}", p[0], p[1]);
+    }
+}
+
 /// Closed multi-ring polygon `d`-string: each ring rendered as `M…L…Z` and
 /// concatenated (use with `fill-rule="evenodd"` for holes). Rings with fewer
 /// than two points are skipped.
@@ -31,7 +35,7 @@ pub fn poly_to_d(rings: &[Vec<[f64; 2]>]) -> String {
         if ring.len() < 2 {
             continue;
         }
-        d.push_str(&polyline_to_d(ring));
+        write_polyline(&mut d, ring.iter().copied());
         d.push('Z');
     }
     d
@@ -68,6 +72,16 @@ mod tests {
         assert_eq!(d, "M0.0000 0.0000L1.5000 2.0000");
     }
 
+    #[test]
+    fn write_polyline_appends_transformed_points() {
+        let mut d = String::from("<path d=\"");
+        write_polyline(
+            &mut d,
+            [[0.0, 0.0], [1.5, 2.0]].iter().map(|p| [p[0] + 1.0, p[1]]),
+        );
+        assert_eq!(d, "<path d=\"M1.0000 0.0000L2.5000 2.0000");
+    }
+
     #[test]
     fn poly_closes_each_ring() {
         let d = poly_to_d(&[vec![[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]]]);
@@ -151,24 +151,25 @@ fn render_drawings(svg: &mut String, drawings: &[Drawing], color: &str) {
                     if poly.len() < 2 {
                         continue;
                     }
-                    let pts: Vec<[f64; 2]> = poly
-                        .iter()
-                        .map(|pt| {
+                    // Rotate and offset points while writing the path data
+                    // straight into the document buffer.
+                    svg.push_str(r#"<path d=""#);
+                    svg::write_polyline(
+                        svg,
+                        poly.iter().map(|pt| {
                             [
                                 pt[0] * cos_a - pt[1] * sin_a + pos[0],
                                 pt[0] * sin_a + pt[1] * cos_a + pos[1],
                             ]
-                        })
-                        .collect();
-                    let d = format!("{}Z", svg::polyline_to_d(&pts));
+                        }),
+                    );
                     if filled.is_none_or(|f| f != 0) {
-                        write!(svg, r#"<path d="{d}" fill="{color}" fill-rule="evenodd"/>"#)
-                            .unwrap();
+                        write!(svg, r#"Z" fill="{color}" fill-rule="evenodd"/>"#).unwrap();
                     } else {
                         let sw = svg::stroke_w(*width);
                         write!(
                             svg,
-                            r#"<path d="{d}" fill="none" stroke="{color}" stroke-width="{sw:.4}"/>"#,
+                            r#"Z" fill="none" stroke="{color}" stroke-width="{sw:.4}"/>"#,
                         )
                         .unwrap();
                     }
@@ -310,10 +311,11 @@ fn render_zones(svg: &mut String, zones: &[crate::types::Zone]) {
                 if poly.len() < 3 {
                     continue;
                 }
-                let d = format!("{}Z", svg::polyline_to_d(poly));
+                svg.push_str(r#"<path d=""#);
+                svg::write_polyline(svg, poly.iter().copied());
                 write!(
                     svg,
-                    r#"<path d="{d}" fill="{PAD_COLOR}" opacity="0.3" fill-rule="evenodd"/>"#,
+                    r#"Z" fill="{PAD_COLOR}" opacity="0.3" fill-rule="evenodd"/>"#,
                 )
                 .unwrap();
             }
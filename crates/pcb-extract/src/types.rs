@@ -3,6 +3,7 @@ use serde::{Deserialize, Serialize};
 use std::collections::HashMap;
 
 /// Round a float to N decimal places.
+#[inline]
 pub fn round_f64(v: f64, places: u32) -> f64 {
     let factor = 10f64.powi(places as i32);
     (v * factor).round() / factor
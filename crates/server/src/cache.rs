@@ -0,0 +1,184 @@
+//! Small bounded in-process caches shared between request handlers.
+
+use std::borrow::Borrow;
+use std::collections::{BTreeMap, HashMap};
+use std::hash::Hash;
+use std::sync::{Mutex, PoisonError};
+
+/// A bounded least-recently-used map, safe to share across handlers.
+///
+/// Each operation takes a short-lived mutex. Entries are stamped with a
+/// monotonically increasing tick, and a tick-ordered index alongside the map
+/// makes lookups, inserts and evictions O(log n) regardless of capacity.
+///
+/// Capacity is a total weight. [`insert`](Self::insert) weighs every entry as
+/// 1, making it an entry count; [`insert_weighted`](Self::insert_weighted)
+/// lets caches of large values bound their memory (e.g. in bytes) instead.
+pub struct LruCache<K, V> {
+    capacity: usize,
+    inner: Mutex<Inner<K, V>>,
+}
+
+struct Inner<K, V> {
+    map: HashMap<K, Entry<V>>,
+    /// Keys ordered by last use; the first entry is the eviction candidate.
+    order: BTreeMap<u64, K>,
+    tick: u64,
+    /// Sum of the weights of all cached entries.
+    weight: usize,
+}
+
+struct Entry<V> {
+    value: V,
+    used: u64,
+    weight: usize,
+}
+
+impl<K: Eq + Hash + Clone, V: Clone> LruCache<K, V> {
+    pub fn new(capacity: usize) -> Self {
+        Self {
+            capacity: capacity.max(1),
+            inner: Mutex::new(Inner {
+                map: HashMap::new(),
+                order: BTreeMap::new(),
+                tick: 0,
+                weight: 0,
+            }),
+        }
+    }
+
+    /// Look up `key`, marking it most recently used.
+    pub fn get<Q>(&self, key: &Q) -> Option<V>
+    where
+        K: Borrow<Q>,
+        Q: Eq + Hash + ?Sized,
+    {
+        let mut inner = self.inner.lock().unwrap_or_else(PoisonError::into_inner);
+        inner.tick += 1;
+        let tick = inner.tick;
+        let Inner { map, order, .. } = &mut *inner;
+        let entry = map.get_mut(key)?;
+        if let Some(k) = order.remove(&entry.used) {
+            order.insert(tick, k);
+        }
+        entry.used = tick;
+        Some(entry.value.clone())
+    }
+
+    /// True when `key` is cached (and marks it most recently used).
+    pub fn contains<Q>(&self, key: &Q) -> bool
+    where
+        K: Borrow<Q>,
+        Q: Eq + Hash + ?Sized,
+    {
+        self.get(key).is_some()
+    }
+
+    /// Insert or replace `key`, evicting the least recently used entry when
+    /// the cache is full.
+    pub fn insert(&self, key: K, value: V) {
+        self.insert_weighted(key, value, 1);
+    }
+
+    /// Insert or replace `key` with the given weight, evicting least recently
+    /// used entries until it fits. A value heavier than the whole capacity is
+    /// not cached.
+    pub fn insert_weighted(&self, key: K, value: V, weight: usize) {
+        let mut inner = self.inner.lock().unwrap_or_else(PoisonError::into_inner);
+        inner.tick += 1;
+        let Inner {
+            map,
+            order,
+            tick,
+            weight: total,
+        } = &mut *inner;
+        if let Some(old) = map.remove(&key) {
+            order.remove(&old.used);
+            *total -= old.weight;
+        }
+        if weight > self.capacity {
+            return;
+        }
+        while *total + weight > self.capacity {
+            let Some((_, oldest)) = order.pop_first() else {
+                break;
+            };
+            if let Some(evicted) = map.remove(&oldest) {
+                *total -= evicted.weight;
+            }
+        }
+        *total += weight;
+        order.insert(*tick, key.clone());
+        map.insert(
+            key,
+            Entry {
+                value,
+                used: *tick,
+                weight,
+            },
+        );
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn evicts_least_recently_used() {
+        let cache = LruCache::new(2);
+        cache.insert("a".to_string(), 1);
+        cache.insert("b".to_string(), 2);
+        // Touch "a" so "b" becomes the eviction candidate.
+        assert_eq!(cache.get("a"), Some(1));
+        cache.insert("c".to_string(), 3);
+        assert!(cache.contains("a"));
+        assert!(!cache.contains("b"));
+        assert!(cache.contains("c"));
+    }
+
+    #[test]
+    fn replacing_a_key_does_not_evict() {
+        let cache = LruCache::new(2);
+        cache.insert("a".to_string(), 1);
+        cache.insert("b".to_string(), 2);
+        cache.insert("a".to_string(), 10);
+        assert_eq!(cache.get("a"), Some(10));
+        assert_eq!(cache.get("b"), Some(2));
+    }
+
+    #[test]
+    fn weighted_inserts_evict_until_they_fit() {
+        let cache = LruCache::new(10);
+        cache.insert_weighted("a", 1, 4);
+        cache.insert_weighted("b", 2, 4);
+        cache.insert_weighted("c", 3, 4);
+        // "a" had to go to make room for "c".
+        assert!(!cache.contains("a"));
+        assert!(cache.contains("b"));
+        assert!(cache.contains("c"));
+        // Too heavy to ever fit: not cached, and nothing else is evicted.
+        cache.insert_weighted("d", 4, 11);
+        assert!(!cache.contains("d"));
+        assert!(cache.contains("b"));
+        assert!(cache.contains("c"));
+    }
+
+    #[test]
+    fn eviction_follows_use_order_at_scale() {
+        let cache = LruCache::new(1_000);
+        for i in 0..1_000 {
+            cache.insert(i, ());
+        }
+        // Re-touch the first half so the second half is older.
+        for i in 0..500 {
+            assert!(cache.contains(&i));
+        }
+        for i in 1_000..1_500 {
+            cache.insert(i, ());
+        }
+        assert!((0..500).all(|i| cache.contains(&i)));
+        assert!((500..1_000).all(|i| !cache.contains(&i)));
+        assert!((1_000..1_500).all(|i| cache.contains(&i)));
+    }
+}
@@ -1,5 +1,5 @@
 use axum::{
-    body::Body,
+    body::{Body, Bytes},
     http::{header, HeaderMap, HeaderValue, StatusCode, Uri},
     response::{IntoResponse, Response},
 };
@@ -8,97 +8,126 @@ use std::io::Write;
 use std::path::Path;
 use std::sync::OnceLock;
 
+/// A viewer asset with every encoding and its `Content-Type` prepared at
+/// load time, so serving one is just refcount bumps.
 struct CompressedAsset {
-    raw: Vec<u8>,
-    brotli: Vec<u8>,
-    gzip: Vec<u8>,
-    mime: String,
+    raw: Bytes,
+    brotli: Bytes,
+    gzip: Bytes,
+    mime: HeaderValue,
 }
 
-static CACHE: OnceLock<HashMap<String, CompressedAsset>> = OnceLock::new();
+const NO_CACHE: &str = "no-cache";
+const IMMUTABLE: &str = "public, max-age=31536000, immutable";
+
+type AssetCache = HashMap<String, CompressedAsset>;
+
+static CACHE: OnceLock<AssetCache> = OnceLock::new();
+static GDS_CACHE: OnceLock<AssetCache> = OnceLock::new();
 
 /// Pre-compress all viewer assets from disk at startup.
 pub fn init_cache(viewer_dir: &Path) {
-    CACHE.get_or_init(|| {
-        let mut map = HashMap::new();
-        let mut total_raw = 0u64;
-        let mut total_br = 0u64;
-
-        let walker = match std::fs::read_dir(viewer_dir) {
-            Ok(w) => w,
-            Err(e) => {
-                tracing::warn!("Could not read viewer dir {}: {e}", viewer_dir.display());
-                return map;
-            }
-        };
+    CACHE.get_or_init(|| load_assets(viewer_dir, "viewer"));
+}
 
-        for entry in walker.flatten() {
-            let path = entry.path();
-            if !path.is_file() {
-                continue;
-            }
-            let filename = match path.file_name().and_then(|f| f.to_str()) {
-                Some(f) => f.to_string(),
-                None => continue,
-            };
-            let raw = match std::fs::read(&path) {
-                Ok(d) => d,
-                Err(_) => continue,
-            };
-            let mime = mime_guess::from_path(&path)
-                .first_or_octet_stream()
-                .to_string();
-
-            let brotli_buf = {
-                let mut buf = Vec::new();
-                {
-                    let mut writer = brotli::CompressorWriter::new(&mut buf, 4096, 11, 22);
-                    writer.write_all(&raw).unwrap();
-                }
-                buf
-            };
-
-            let gzip_buf = {
-                let mut encoder =
-                    flate2::write::GzEncoder::new(Vec::new(), flate2::Compression::best());
-                encoder.write_all(&raw).unwrap();
-                encoder.finish().unwrap()
-            };
-
-            total_raw += raw.len() as u64;
-            total_br += brotli_buf.len() as u64;
-
-            map.insert(
-                filename,
-                CompressedAsset {
-                    raw,
-                    brotli: brotli_buf,
-                    gzip: gzip_buf,
-                    mime,
-                },
-            );
+/// Pre-compress all GDSII viewer assets from disk at startup.
+pub fn init_gds_cache(gds_viewer_dir: &Path) {
+    GDS_CACHE.get_or_init(|| load_assets(gds_viewer_dir, "GDSII viewer"));
+}
+
+fn load_assets(dir: &Path, label: &str) -> AssetCache {
+    let mut map = HashMap::new();
+    let mut total_raw = 0u64;
+    let mut total_br = 0u64;
+
+    let walker = match std::fs::read_dir(dir) {
+        Ok(w) => w,
+        Err(e) => {
+            tracing::warn!("Could not read {label} dir {}: {e}", dir.display());
+            return map;
         }
+    };
 
-        if total_raw > 0 {
-            tracing::info!(
-                "Pre-compressed {} viewer assets: {:.1} MB raw -> {:.1} MB brotli ({:.0}% reduction)",
-                map.len(),
-                total_raw as f64 / 1_048_576.0,
-                total_br as f64 / 1_048_576.0,
-                (1.0 - total_br as f64 / total_raw as f64) * 100.0
-            );
+    for entry in walker.flatten() {
+        let path = entry.path();
+        if !path.is_file() {
+            continue;
         }
+        let filename = match path.file_name().and_then(|f| f.to_str()) {
+            Some(f) => f.to_string(),
+            None => continue,
+        };
+        let raw = match std::fs::read(&path) {
+            Ok(d) => d,
+            Err(_) => continue,
+        };
+        let mime = HeaderValue::from_str(
+            mime_guess::from_path(&path)
+                .first_or_octet_stream()
+                .as_ref(),
+        )
+        .unwrap_or_else(|_| HeaderValue::from_static("application/octet-stream"));
+
+        let brotli_buf = {
+            let mut buf = Vec::new();
+            {
+                let mut writer = brotli::CompressorWriter::new(&mut buf, 4096, 11, 22);
+                writer.write_all(&raw).unwrap();
+            }
+            buf
+        };
+
+        let gzip_buf = {
+            let mut encoder =
+                flate2::write::GzEncoder::new(Vec::new(), flate2::Compression::best());
+            encoder.write_all(&raw).unwrap();
+            encoder.finish().unwrap()
+        };
 
-        map
-    });
+        total_raw += raw.len() as u64;
+        total_br += brotli_buf.len() as u64;
+
+        map.insert(
+            filename,
+            CompressedAsset {
+                raw: raw.into(),
+                brotli: brotli_buf.into(),
+                gzip: gzip_buf.into(),
+                mime,
+            },
+        );
+    }
+
+    if total_raw > 0 {
+        tracing::info!(
+            "Pre-compressed {} {label} assets: {:.1} MB raw -> {:.1} MB brotli ({:.0}% reduction)",
+            map.len(),
+            total_raw as f64 / 1_048_576.0,
+            total_br as f64 / 1_048_576.0,
+            (1.0 - total_br as f64 / total_raw as f64) * 100.0
+        );
+    }
+
+    map
 }
 
 /// Serve pre-compressed viewer assets. Falls back to index.html for SPA routing.
 pub async fn serve_viewer(uri: Uri, headers: HeaderMap) -> Response {
     let path = uri.path().trim_start_matches("/viewer/");
+    serve_cached(&CACHE, path, &headers)
+}
+
+/// Serve pre-compressed GDSII viewer assets at `/gview/`. Falls back to
+/// index.html for SPA routing.
+pub async fn serve_gds_viewer(uri: Uri, headers: HeaderMap) -> Response {
+    let path = uri.path().trim_start_matches("/gview/");
+    serve_cached(&GDS_CACHE, path, &headers)
+}
+
+fn serve_cached(cache: &OnceLock<AssetCache>, path: &str, headers: &HeaderMap) -> Response {
     let path = if path.is_empty() { "index.html" } else { path };
 
-    let cache = match CACHE.get() {
+    let cache = match cache.get() {
         Some(c) => c,
         None => {
             return (
@@ -109,43 +138,128 @@ pub async fn serve_viewer(uri: Uri, headers: HeaderMap) -> Response {
         }
     };
 
+    // Unknown paths fall back to the SPA shell, which must stay revalidated
+    // however it was requested: only real asset names are immutable.
+    let asset = match cache.get(path) {
+        Some(asset) if path != "index.html" => Some((asset, IMMUTABLE)),
+        _ => cache.get("index.html").map(|asset| (asset, NO_CACHE)),
+    };
+
+    match asset {
+        Some((asset, cache_control)) => asset_response(asset, cache_control, headers),
+        None => (StatusCode::NOT_FOUND, "Asset not found").into_response(),
+    }
+}
+
+/// Serve the cached viewer `index.html` (the shell for `/b/{id}`). Returns
+/// `None` when the viewer assets were not found at startup.
+pub fn index_response(headers: &HeaderMap) -> Option<Response> {
+    let asset = CACHE.get()?.get("index.html")?;
+    Some(asset_response(asset, NO_CACHE, headers))
+}
+
+/// Serve the cached GDSII viewer `index.html` (the shell for `/g/{id}`).
+/// Returns `None` when the GDSII viewer assets were not found at startup.
+pub fn gds_index_response(headers: &HeaderMap) -> Option<Response> {
+    let asset = GDS_CACHE.get()?.get("index.html")?;
+    Some(asset_response(asset, NO_CACHE, headers))
+}
+
+/// Build a response for a cached asset, picking the best encoding the client
+/// accepts.
+fn asset_response(
+    asset: &CompressedAsset,
+    cache_control: &'static str,
+    headers: &HeaderMap,
+) -> Response {
     let accept = headers
         .get(header::ACCEPT_ENCODING)
         .and_then(|v| v.to_str().ok())
         .unwrap_or("");
 
-    let asset = cache.get(path).or_else(|| cache.get("index.html"));
+    let (body, encoding) = if accept.contains("br") {
+        (asset.brotli.clone(), Some("br"))
+    } else if accept.contains("gzip") {
+        (asset.gzip.clone(), Some("gzip"))
+    } else {
+        (asset.raw.clone(), None)
+    };
+
+    let mut resp = Response::new(Body::from(body));
+    let resp_headers = resp.headers_mut();
+    resp_headers.insert(header::CONTENT_TYPE, asset.mime.clone());
+    resp_headers.insert(
+        header::CACHE_CONTROL,
+        HeaderValue::from_static(cache_control),
+    );
+    // The encoding is negotiated here rather than by `CompressionLayer`, which
+    // skips responses that already carry `Content-Encoding` and so would not
+    // add `Vary` either. Without it a shared cache could hand the brotli body
+    // to clients that never asked for it.
+    resp_headers.insert(header::VARY, HeaderValue::from_static("accept-encoding"));
+    if let Some(enc) = encoding {
+        resp_headers.insert(header::CONTENT_ENCODING, HeaderValue::from_static(enc));
+    }
 
-    match asset {
-        Some(asset) => {
-            let (body, encoding) = if accept.contains("br") {
-                (asset.brotli.as_slice(), Some("br"))
-            } else if accept.contains("gzip") {
-                (asset.gzip.as_slice(), Some("gzip"))
-            } else {
-                (asset.raw.as_slice(), None)
-            };
-
-            let cache_control = if path == "index.html" {
-                "no-cache"
-            } else {
-                "public, max-age=31536000, immutable"
-            };
-
-            let mut resp = Response::builder()
-                .status(StatusCode::OK)
-                .header(header::CONTENT_TYPE, &asset.mime)
-                .header(header::CACHE_CONTROL, cache_control)
-                .body(Body::from(body.to_vec()))
-                .unwrap();
-
-            if let Some(enc) = encoding {
-                resp.headers_mut()
-                    .insert(header::CONTENT_ENCODING, HeaderValue::from_static(enc));
-            }
+    resp
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn negotiated_responses_vary_on_accept_encoding() {
+        let asset = CompressedAsset {
+            raw: Bytes::from_static(b"raw"),
+            brotli: Bytes::from_static(b"br"),
+            gzip: Bytes::from_static(b"gz"),
+            mime: HeaderValue::from_static("text/html"),
+        };
+        for (accept, encoding) in [("br, gzip", Some("br")), ("gzip", Some("gzip")), ("", None)] {
+            let mut headers = HeaderMap::new();
+            headers.insert(header::ACCEPT_ENCODING, HeaderValue::from_static(accept));
+            let resp = asset_response(&asset, IMMUTABLE, &headers);
+            assert_eq!(resp.headers()[header::VARY], "accept-encoding");
+            assert_eq!(
+                resp.headers()
+                    .get(header::CONTENT_ENCODING)
+                    .and_then(|v| v.to_str().ok()),
+                encoding
+            );
+        }
+    }
 
-            resp
+    #[test]
+    fn spa_fallback_is_not_cached_as_immutable() {
+        let asset = |body: &'static [u8], mime: &'static str| CompressedAsset {
+            raw: Bytes::from_static(body),
+            brotli: Bytes::from_static(body),
+            gzip: Bytes::from_static(body),
+            mime: HeaderValue::from_static(mime),
+        };
+        let cache = OnceLock::new();
+        cache.get_or_init(|| {
+            HashMap::from([
+                ("index.html".to_string(), asset(b"shell", "text/html")),
+                ("app.js".to_string(), asset(b"app", "text/javascript")),
+            ])
+        });
+        let headers = HeaderMap::new();
+        for (path, cache_control) in [
+            ("", NO_CACHE),
+            ("index.html", NO_CACHE),
+            ("app.js", IMMUTABLE),
+            ("missing.js", NO_CACHE),
+            ("some/spa/route", NO_CACHE),
+        ] {
+            let resp = serve_cached(&cache, path, &headers);
+            assert_eq!(resp.status(), StatusCode::OK, "{path}");
+            assert_eq!(
+                resp.headers()[header::CACHE_CONTROL],
+                cache_control,
+                "{path}"
+            );
         }
-        None => (StatusCode::NOT_FOUND, "Asset not found").into_response(),
     }
 }
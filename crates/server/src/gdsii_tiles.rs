@@ -4,26 +4,99 @@
 //! (manifest + serialized BSP index + eager tiles) and stores it under
 //! `gdsii/{id}/`. The routes serve the viewer shell, the manifest, and tiles
 //! (pull-through cache; deep-zoom tiles are rendered on demand from the cached
-//! index). Viewer assets are served from `GDS_VIEWER_DIR` at `/gview/`.
+//! index). Viewer assets are loaded from `GDS_VIEWER_DIR` into the startup
+//! asset cache and served at `/gview/` by `compressed_assets`.
 
+use std::collections::HashMap;
+use std::sync::{Arc, Mutex, PoisonError};
 use std::time::Duration;
 
 use axum::{
-    body::Body,
+    body::Bytes,
     extract::{Path, State},
-    http::{header, StatusCode, Uri},
-    response::{Html, IntoResponse, Response},
+    http::{header, HeaderMap, StatusCode},
+    response::{IntoResponse, Response},
 };
 use pcb_extract::parsers::gdsii::tile::WorldBox;
 use pcb_extract::parsers::gdsii::tileset::{self, Manifest, TileIndex};
+use tokio::sync::OnceCell;
 use uuid::Uuid;
 
+use crate::cache::LruCache;
+use crate::s3::S3Client;
 use crate::AppState;
 
 /// Zoom levels pre-rendered at ingest; deeper levels render on demand.
 const EAGER_MAX_Z: u32 = 5;
 const INGEST_TIMEOUT: Duration = Duration::from_secs(120);
 const SEMAPHORE_TIMEOUT: Duration = Duration::from_secs(30);
+/// Memory budget for decoded tile indexes, measured by
+/// [`TileIndex::decoded_size`]. The serialized `index.bin` is varint-encoded
+/// and several times smaller, so it would understate what the cache holds.
+pub const MAX_CACHED_INDEX_BYTES: usize = 256 * 1024 * 1024;
+
+/// What deep-zoom rendering needs for one view: the manifest's world bounds
+/// and zoom limit plus the decoded index. Tile sets are never rewritten, so
+/// one decode serves every later tile request for that id.
+pub struct RenderIndex {
+    bounds: WorldBox,
+    max_z: u32,
+    index: TileIndex,
+    /// Estimated in-memory size of `index`, used as its cache weight.
+    size: usize,
+}
+
+type InFlightLoad = Arc<OnceCell<Arc<RenderIndex>>>;
+
+/// Decoded tile indexes shared across on-demand tile renders, bounded by
+/// size. Concurrent misses for the same id wait on a single load instead of
+/// each downloading and decoding the index.
+pub struct IndexCache {
+    loaded: LruCache<String, Arc<RenderIndex>>,
+    loading: Mutex<HashMap<String, InFlightLoad>>,
+}
+
+impl IndexCache {
+    pub fn new(max_bytes: usize) -> Self {
+        Self {
+            loaded: LruCache::new(max_bytes),
+            loading: Mutex::new(HashMap::new()),
+        }
+    }
+
+    async fn get_or_load(
+        &self,
+        s3: &S3Client,
+        id: &str,
+    ) -> Result<Arc<RenderIndex>, (StatusCode, &'static str)> {
+        if let Some(render) = self.loaded.get(id) {
+            return Ok(render);
+        }
+        let cell = {
+            let mut loading = self.loading.lock().unwrap_or_else(PoisonError::into_inner);
+            // Re-check under the lock: a finished load publishes to `loaded`
+            // before it retires its in-flight slot.
+            if let Some(render) = self.loaded.get(id) {
+                return Ok(render);
+            }
+            loading.entry(id.to_string()).or_default().clone()
+        };
+
+        let result = cell
+            .get_or_try_init(|| load_render_index(s3, id))
+            .await
+            .cloned();
+        if let Ok(render) = &result {
+            self.loaded
+                .insert_weighted(id.to_string(), render.clone(), render.size);
+        }
+        let mut loading = self.loading.lock().unwrap_or_else(PoisonError::into_inner);
+        if loading.get(id).is_some_and(|c| Arc::ptr_eq(c, &cell)) {
+            loading.remove(id);
+        }
+        result
+    }
+}
 
 fn err(status: StatusCode, msg: &str) -> Response {
     (status, msg.to_string()).into_response()
@@ -52,7 +125,7 @@ fn valid_tile_key(key: &str) -> bool {
 
 /// Build and store the tile set for an uploaded GDSII file. Returns on success
 /// with artifacts written under `gdsii/{id}/`.
-pub async fn ingest(state: &AppState, id: &str, data: Vec<u8>) -> Result<(), String> {
+pub async fn ingest(state: &AppState, id: &str, data: Bytes) -> Result<(), String> {
     // Archive the original upload.
     let _ = state
         .s3
@@ -113,23 +186,23 @@ pub async fn ingest(state: &AppState, id: &str, data: Vec<u8>) -> Result<(), Str
 
 /// Serve the GDSII viewer shell at `/g/{id}` (the WASM app reads the id from the
 /// path and fetches the manifest).
-pub async fn get_gds_viewer(State(state): State<AppState>, Path(id): Path<String>) -> Response {
+pub async fn get_gds_viewer(
+    State(state): State<AppState>,
+    Path(id): Path<String>,
+    headers: HeaderMap,
+) -> Response {
     if !valid_id(&id) {
         return err(StatusCode::NOT_FOUND, "not found");
     }
-    if state
+    if !state
         .s3
-        .get_object(&format!("gdsii/{id}/manifest.json"))
+        .object_exists(&format!("gdsii/{id}/manifest.json"))
         .await
-        .is_err()
     {
         return err(StatusCode::NOT_FOUND, "GDSII view not found");
     }
-    let index_path = state.gds_viewer_dir.join("index.html");
-    match tokio::fs::read_to_string(&index_path).await {
-        Ok(html) => Html(html).into_response(),
-        Err(_) => err(StatusCode::INTERNAL_SERVER_ERROR, "Viewer not available"),
-    }
+    crate::compressed_assets::gds_index_response(&headers)
+        .unwrap_or_else(|| err(StatusCode::INTERNAL_SERVER_ERROR, "Viewer not available"))
 }
 
 /// Serve the tile-set manifest.
@@ -171,47 +244,31 @@ pub async fn get_gds_tile(
     let tile_key = format!("gdsii/{id}/tiles/{z}/{x}/{y}/{key}.svgz");
 
     if let Ok(cached) = state.s3.get_object(&tile_key).await {
-        return svgz_response(cached);
+        return svgz_response(cached.into());
     }
 
     // Cache miss — render this tile on demand from the cached index + manifest.
-    let Ok(manifest_bytes) = state
-        .s3
-        .get_object(&format!("gdsii/{id}/manifest.json"))
-        .await
-    else {
-        return err(StatusCode::NOT_FOUND, "view not found");
-    };
-    let Ok(manifest) = serde_json::from_slice::<Manifest>(&manifest_bytes) else {
-        return err(StatusCode::INTERNAL_SERVER_ERROR, "bad manifest");
+    let render = match state.gds_indexes.get_or_load(&state.s3, &id).await {
+        Ok(render) => render,
+        Err((status, msg)) => return err(status, msg),
     };
-    if z > manifest.zoom.max {
+    if z > render.max_z {
         return err(StatusCode::NOT_FOUND, "zoom level out of range");
     }
-    let Ok(index_bytes) = state.s3.get_object(&format!("gdsii/{id}/index.bin")).await else {
-        return err(StatusCode::NOT_FOUND, "index not found");
-    };
-
-    let bounds = WorldBox {
-        minx: manifest.extent_nm.minx,
-        miny: manifest.extent_nm.miny,
-        maxx: manifest.extent_nm.maxx,
-        maxy: manifest.extent_nm.maxy,
-    };
     let blobs = match tokio::task::spawn_blocking(move || {
-        TileIndex::from_bytes(&index_bytes)
-            .map(|index| tileset::render_tile(bounds, &index, z, x, y))
+        tileset::render_tile(render.bounds, &render.index, z, x, y)
     })
     .await
     {
-        Ok(Ok(b)) => b,
-        _ => return err(StatusCode::INTERNAL_SERVER_ERROR, "tile render failed"),
+        Ok(b) => b,
+        Err(_) => return err(StatusCode::INTERNAL_SERVER_ERROR, "tile render failed"),
     };
 
     // Store every layer blob for this tile; return the requested one.
     let want = format!("{z}/{x}/{y}/{key}.svgz");
-    let mut found: Option<Vec<u8>> = None;
+    let mut found: Option<Bytes> = None;
     for (path, body) in blobs {
+        let body = Bytes::from(body);
         if path == want {
             found = Some(body.clone());
         }
@@ -227,7 +284,45 @@ pub async fn get_gds_tile(
     }
 }
 
-fn svgz_response(body: Vec<u8>) -> Response {
+/// Fetch and decode the manifest + index for `id`.
+async fn load_render_index(
+    s3: &S3Client,
+    id: &str,
+) -> Result<Arc<RenderIndex>, (StatusCode, &'static str)> {
+    let Ok(manifest_bytes) = s3.get_object(&format!("gdsii/{id}/manifest.json")).await else {
+        return Err((StatusCode::NOT_FOUND, "view not found"));
+    };
+    let Ok(manifest) = serde_json::from_slice::<Manifest>(&manifest_bytes) else {
+        return Err((StatusCode::INTERNAL_SERVER_ERROR, "bad manifest"));
+    };
+    let Ok(index_bytes) = s3.get_object(&format!("gdsii/{id}/index.bin")).await else {
+        return Err((StatusCode::NOT_FOUND, "index not found"));
+    };
+    let Ok(Ok((index, size))) = tokio::task::spawn_blocking(move || {
+        TileIndex::from_bytes(&index_bytes).map(|index| {
+            let size = index.decoded_size();
+            (index, size)
+        })
+    })
+    .await
+    else {
+        return Err((StatusCode::INTERNAL_SERVER_ERROR, "bad index"));
+    };
+
+    Ok(Arc::new(RenderIndex {
+        bounds: WorldBox {
+            minx: manifest.extent_nm.minx,
+            miny: manifest.extent_nm.miny,
+            maxx: manifest.extent_nm.maxx,
+            maxy: manifest.extent_nm.maxy,
+        },
+        max_z: manifest.zoom.max,
+        index,
+        size,
+    }))
+}
+
+fn svgz_response(body: Bytes) -> Response {
     (
         StatusCode::OK,
         [
@@ -240,37 +335,22 @@ fn svgz_response(body: Vec<u8>) -> Response {
         .into_response()
 }
 
-/// Serve GDSII viewer static assets from `GDS_VIEWER_DIR` at `/gview/`, with an
-/// SPA fallback to `index.html`.
-pub async fn serve_gview(State(state): State<AppState>, uri: Uri) -> Response {
-    let rel = uri.path().trim_start_matches("/gview/");
-    let rel = if rel.is_empty() { "index.html" } else { rel };
-    // Reject traversal; only serve plain relative paths.
-    if rel.contains("..") {
-        return err(StatusCode::NOT_FOUND, "not found");
-    }
-    let path = state.gds_viewer_dir.join(rel);
-    let bytes = match tokio::fs::read(&path).await {
-        Ok(b) => b,
-        Err(_) => match tokio::fs::read(state.gds_viewer_dir.join("index.html")).await {
-            Ok(b) => b,
-            Err(_) => return err(StatusCode::NOT_FOUND, "asset not found"),
-        },
-    };
-    let mime = mime_guess::from_path(&path)
-        .first_or_octet_stream()
-        .to_string();
-    (
-        StatusCode::OK,
-        [(header::CONTENT_TYPE, mime)],
-        Body::from(bytes),
-    )
-        .into_response()
-}
-
 #[cfg(test)]
 mod tests {
-    use super::{strip_tile_ext, valid_tile_key};
+    use super::{strip_tile_ext, valid_tile_key, IndexCache, S3Client, StatusCode};
+
+    #[tokio::test]
+    async fn concurrent_index_misses_share_and_retire_one_load() {
+        let s3 = S3Client::from_env().await;
+        let cache = IndexCache::new(1024);
+        let id = uuid::Uuid::new_v4().to_string();
+        let (a, b) = tokio::join!(cache.get_or_load(&s3, &id), cache.get_or_load(&s3, &id));
+        assert_eq!(a.err(), Some((StatusCode::NOT_FOUND, "view not found")));
+        assert_eq!(b.err(), Some((StatusCode::NOT_FOUND, "view not found")));
+        // A failed load is not cached and leaves no in-flight slot behind.
+        assert!(cache.loading.lock().unwrap().is_empty());
+        assert!(!cache.loaded.contains(id.as_str()));
+    }
 
     #[test]
     fn tile_key_accepts_viewer_svgz_suffix() {
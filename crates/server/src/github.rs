@@ -1,6 +1,7 @@
 use axum::{
+    body::Bytes,
     extract::{Query, State},
-    http::{HeaderMap, StatusCode},
+    http::{header, HeaderMap, HeaderValue, StatusCode},
     response::IntoResponse,
 };
 use serde::{Deserialize, Serialize};
@@ -47,7 +48,11 @@ pub async fn gh_render(
 ) -> impl IntoResponse {
     match gh_render_inner(state, headers, params).await {
         Ok(response) => response,
-        Err(msg) => (StatusCode::OK, svg_headers("error"), error_svg(&msg)),
+        Err(msg) => (
+            StatusCode::OK,
+            svg_headers("error"),
+            Bytes::from(error_svg(&msg)),
+        ),
     }
 }
 
@@ -55,7 +60,7 @@ async fn gh_render_inner(
     state: AppState,
     headers: HeaderMap,
     params: GhRenderParams,
-) -> Result<(StatusCode, HeaderMap, Vec<u8>), String> {
+) -> Result<(StatusCode, HeaderMap, Bytes), String> {
     // Parse file param: owner/repo/path/to/file.ext
     let file = params.file.trim_matches('/');
     if file.contains("..") {
@@ -100,17 +105,16 @@ async fn gh_render_inner(
     if let Ok(cached_bytes) = state.s3.get_object(&cache_key).await {
         if let Ok(entry) = serde_json::from_slice::<GhCacheEntry>(&cached_bytes) {
             if entry.sha == gh_info.sha {
-                // Check If-None-Match for 304
-                if let Some(etag) = headers.get("if-none-match") {
-                    if etag.as_bytes() == format!("\"{}\"", entry.sha).as_bytes() {
-                        return Ok((StatusCode::NOT_MODIFIED, HeaderMap::new(), Vec::new()));
-                    }
+                // Check If-None-Match for 304 (compares the bare SHA, no
+                // quoted copy needed)
+                if crate::routes::etag_matches(&headers, &entry.sha) {
+                    return Ok((StatusCode::NOT_MODIFIED, HeaderMap::new(), Bytes::new()));
                 }
 
                 // Serve cached thumbnail
                 let thumb_key = format!("thumbnails/{}.svg", entry.bom_id);
                 if let Ok(svg) = state.s3.get_object(&thumb_key).await {
-                    return Ok((StatusCode::OK, svg_headers(&entry.sha), svg));
+                    return Ok((StatusCode::OK, svg_headers(&entry.sha), svg.into()));
                 }
             }
         }
@@ -135,14 +139,15 @@ async fn gh_render_inner(
         .ok_or_else(|| "Unsupported file format".to_string())?;
 
     // Parse with concurrency limit
-    let pcb_data = crate::routes::parse_pcb_guarded(&state, file_bytes.clone(), format).await?;
+    let crate::routes::ParsedPcb { bom, data } =
+        crate::routes::parse_pcb_guarded(&state, file_bytes.clone(), format).await?;
 
     let filename = file_path
         .file_name()
         .map(|f| f.to_string_lossy().to_string())
         .unwrap_or_else(|| "file".to_string());
     let bom_id = Uuid::new_v4().to_string();
-    let component_count = pcb_data.footprints.len();
+    let component_count = bom.components;
     let file_size = file_bytes.len();
 
     // Store through normal upload path
@@ -152,16 +157,6 @@ async fn gh_render_inner(
         .put_object(&upload_key, file_bytes, "application/octet-stream")
         .await;
 
-    let pcbdata_json =
-        serde_json::to_vec(&pcb_data).map_err(|_| "Serialization failed".to_string())?;
-    let bom_key = format!("boms/{bom_id}.json");
-    state
-        .s3
-        .put_object(&bom_key, pcbdata_json, "application/json")
-        .await
-        .map_err(|_| "Storage failed".to_string())?;
-
-    // Store metadata
     let meta = serde_json::json!({
         "id": bom_id,
         "filename": filename,
@@ -171,13 +166,11 @@ async fn gh_render_inner(
         "github_path": path,
         "github_ref": git_ref,
     });
-    let meta_key = format!("boms/{bom_id}.meta.json");
-    if let Ok(meta_json) = serde_json::to_vec(&meta) {
-        let _ = state
-            .s3
-            .put_object(&meta_key, meta_json, "application/json")
-            .await;
-    }
+    let meta_json = serde_json::to_vec(&meta).ok();
+
+    crate::routes::store_bom(&state, &bom_id, bom.pcbdata_gz.clone(), meta_json)
+        .await
+        .map_err(|_| "Storage failed".to_string())?;
 
     // Add to recent list unless the caller opted out.
     if !params.secret {
@@ -195,10 +188,21 @@ async fn gh_render_inner(
     }
 
     // Render thumbnail
-    let svg = tokio::task::spawn_blocking(move || pcb_extract::thumbnail::render_svg(&pcb_data))
-        .await
-        .map_err(|_| "Thumbnail render failed".to_string())?;
-    let svg_bytes = svg.into_bytes();
+    // A parse-cache hit carries only the stored form, so rebuild the board
+    // from it in that case.
+    let svg = tokio::task::spawn_blocking(move || {
+        let pcb_data = match data {
+            Some(pcb_data) => pcb_data,
+            None => crate::s3::from_stored_json(&bom.pcbdata_gz).ok()?,
+        };
+        Some(pcb_extract::thumbnail::render_svg(&pcb_data))
+    })
+    .await
+    .ok()
+    .flatten()
+    .ok_or_else(|| "Thumbnail render failed".to_string())?;
+    // One shared buffer backs both the cache write and the response.
+    let svg_bytes = Bytes::from(svg);
 
     // Store thumbnail
     let thumb_key = format!("thumbnails/{bom_id}.svg");
@@ -224,19 +228,35 @@ async fn gh_render_inner(
 
 fn svg_headers(sha: &str) -> HeaderMap {
     let mut headers = HeaderMap::new();
-    headers.insert("content-type", "image/svg+xml".parse().unwrap());
-    headers.insert("cache-control", "public, max-age=300".parse().unwrap());
-    headers.insert("etag", format!("\"{sha}\"").parse().unwrap());
+    headers.insert(
+        header::CONTENT_TYPE,
+        HeaderValue::from_static("image/svg+xml"),
+    );
+    headers.insert(
+        header::CACHE_CONTROL,
+        HeaderValue::from_static("public, max-age=300"),
+    );
+    headers.insert(header::ETAG, format!("\"{sha}\"").parse().unwrap());
     headers
 }
 
+/// Escape XML special characters in a single pass over the input.
+fn escape_xml(s: &str) -> String {
+    let mut out = String::with_capacity(s.len());
+    for c in s.chars() {
+        match c {
+            '&' => out.push_str("&amp;"),
+            '<' => out.push_str("&lt;"),
+            '>' => out.push_str("&gt;"),
+            '"' => out.push_str("&quot;"),
+            _ => out.push(c),
+        }
+    }
+    out
+}
+
 fn error_svg(message: &str) -> Vec<u8> {
-    // Escape XML special characters
-    let escaped = message
-        .replace('&', "&amp;")
-        .replace('<', "&lt;")
-        .replace('>', "&gt;")
-        .replace('"', "&quot;");
+    let escaped = escape_xml(message);
 
     // Word-wrap long messages into lines of ~40 chars
     let mut lines: Vec<String> = Vec::new();
@@ -340,7 +360,7 @@ async fn download_raw(
     repo: &str,
     git_ref: &str,
     path: &str,
-) -> Result<Vec<u8>, GhError> {
+) -> Result<Bytes, GhError> {
     let url = format!("https://raw.githubusercontent.com/{repo}/{git_ref}/{path}");
     let resp = client
         .get(&url)
@@ -352,7 +372,6 @@ async fn download_raw(
         200 => resp
             .bytes()
             .await
-            .map(|b| b.to_vec())
             .map_err(|e| GhError::Other(format!("Failed to read response body: {e}"))),
         404 => Err(GhError::NotFound),
         403 | 429 => Err(GhError::RateLimited),
@@ -409,6 +428,17 @@ mod tests {
         assert!(text.contains("&amp;"));
     }
 
+    #[test]
+    fn test_escape_xml() {
+        assert_eq!(
+            escape_xml(r#"a & <b> "c""#),
+            "a &amp; &lt;b&gt; &quot;c&quot;"
+        );
+        // Already-escaped input is escaped again, not passed through.
+        assert_eq!(escape_xml("&amp;"), "&amp;amp;");
+        assert_eq!(escape_xml("plain"), "plain");
+    }
+
     #[test]
     fn test_error_svg_wraps_long_messages() {
         let svg = error_svg(
@@ -454,4 +484,16 @@ mod tests {
         assert!(key.starts_with("gh/owner/repo/main/"));
         assert!(key.ends_with(".json"));
     }
+
+    #[test]
+    fn test_svg_etag_satisfies_if_none_match() {
+        let sha = "a1b2c3d4e5f6a7b8c9d0e1f2a3b4c5d6e7f8a9b0";
+        let mut request = HeaderMap::new();
+        request.insert(
+            header::IF_NONE_MATCH,
+            svg_headers(sha)[header::ETAG].clone(),
+        );
+        assert!(crate::routes::etag_matches(&request, sha));
+        assert!(!crate::routes::etag_matches(&request, "deadbeef"));
+    }
 }
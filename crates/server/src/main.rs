@@ -1,3 +1,4 @@
+mod cache;
 mod compressed_assets;
 mod gdsii_tiles;
 mod github;
@@ -39,6 +40,14 @@ async fn main() {
         gds_viewer_dir.display()
     );
 
+    // Pre-compress viewer assets on blocking threads while the recent list
+    // loads; both are awaited before the listener binds, so the first request
+    // still finds a warm cache.
+    let precompress_viewer =
+        tokio::task::spawn_blocking(move || compressed_assets::init_cache(&viewer_dir));
+    let precompress_gds =
+        tokio::task::spawn_blocking(move || compressed_assets::init_gds_cache(&gds_viewer_dir));
+
     let recent = routes::load_recent(&s3_client).await;
     tracing::info!("Loaded {} recent public uploads", recent.len());
 
@@ -70,18 +79,30 @@ async fn main() {
         .unwrap_or(4);
     tracing::info!("Max concurrent parses: {max_concurrent_parses}");
 
+    let base_url =
+        std::env::var("BASE_URL").unwrap_or_else(|_| "http://localhost:8000".to_string());
+    tracing::info!("Base URL: {base_url}");
+
     let state = AppState {
         s3: s3_client,
-        viewer_dir: viewer_dir.clone(),
-        gds_viewer_dir,
         recent: Arc::new(RwLock::new(recent)),
         http_client,
         max_upload_bytes,
         parse_semaphore: Arc::new(Semaphore::new(max_concurrent_parses)),
+        base_url,
+        known_boms: Arc::new(cache::LruCache::new(routes::MAX_KNOWN_BOMS)),
+        gds_indexes: Arc::new(gdsii_tiles::IndexCache::new(
+            gdsii_tiles::MAX_CACHED_INDEX_BYTES,
+        )),
+        parsed_pcbs: Arc::new(cache::LruCache::new(routes::MAX_CACHED_PARSE_BYTES)),
     };
 
-    // Pre-compress viewer assets at startup
-    compressed_assets::init_cache(&viewer_dir);
+    precompress_viewer
+        .await
+        .expect("Viewer asset pre-compression failed");
+    precompress_gds
+        .await
+        .expect("GDSII viewer asset pre-compression failed");
 
     // Spawn background re-parse of stale boards
     let reparse_s3 = state.s3.clone();
@@ -115,12 +136,19 @@ pub fn build_app(state: AppState) -> Router {
 #[derive(Clone)]
 pub struct AppState {
     pub s3: s3::S3Client,
-    pub viewer_dir: PathBuf,
-    pub gds_viewer_dir: PathBuf,
     pub recent: Arc<RwLock<Vec<routes::RecentEntry>>>,
     pub http_client: reqwest::Client,
     pub max_upload_bytes: usize,
     pub parse_semaphore: Arc<Semaphore>,
+    /// Public base URL for generated share links, resolved once from `BASE_URL`.
+    pub base_url: String,
+    /// BOM ids known to exist in storage, so `/b/{id}` can skip the HEAD check.
+    pub known_boms: Arc<cache::LruCache<String, ()>>,
+    /// Decoded GDSII tile indexes, reused across on-demand tile renders.
+    pub gds_indexes: Arc<gdsii_tiles::IndexCache>,
+    /// Recent prepared BOMs keyed by upload content hash and format, bounded
+    /// by gzipped size.
+    pub parsed_pcbs: Arc<cache::LruCache<routes::ParseKey, routes::PreparedBom>>,
 }
 
 #[cfg(test)]
@@ -132,16 +160,20 @@ mod tests {
 
     async fn test_state() -> AppState {
         let s3 = s3::S3Client::from_env().await;
-        let viewer_dir = PathBuf::from("crates/viewer/dist");
-        compressed_assets::init_cache(&viewer_dir);
+        compressed_assets::init_cache(&PathBuf::from("crates/viewer/dist"));
+        compressed_assets::init_gds_cache(&PathBuf::from("crates/gds-viewer/dist"));
         AppState {
             s3,
-            viewer_dir,
-            gds_viewer_dir: PathBuf::from("crates/gds-viewer/dist"),
             recent: Arc::new(RwLock::new(Vec::new())),
             http_client: reqwest::Client::new(),
             max_upload_bytes: 50 * 1024 * 1024,
             parse_semaphore: Arc::new(Semaphore::new(4)),
+            base_url: "http://localhost:8000".to_string(),
+            known_boms: Arc::new(cache::LruCache::new(routes::MAX_KNOWN_BOMS)),
+            gds_indexes: Arc::new(gdsii_tiles::IndexCache::new(
+                gdsii_tiles::MAX_CACHED_INDEX_BYTES,
+            )),
+            parsed_pcbs: Arc::new(cache::LruCache::new(routes::MAX_CACHED_PARSE_BYTES)),
         }
     }
 
@@ -196,6 +228,110 @@ mod tests {
         assert_eq!(resp.status(), 404);
     }
 
+    #[tokio::test]
+    async fn test_missing_bom_viewer_returns_404() {
+        let app = build_app(test_state().await);
+        let resp = app
+            .oneshot(
+                Request::get("/b/00000000-0000-0000-0000-000000000000")
+                    .body(Body::empty())
+                    .unwrap(),
+            )
+            .await
+            .unwrap();
+        assert_eq!(resp.status(), 404);
+    }
+
+    #[tokio::test]
+    async fn test_bom_data_revalidates_with_etag() {
+        let state = test_state().await;
+        let id = uuid::Uuid::new_v4().to_string();
+        let key = format!("boms/{id}.json");
+        state.s3.put_json_gzip(&key, b"{}".to_vec()).await.unwrap();
+        let app = build_app(state.clone());
+        let uri = format!("/b/{id}/data");
+
+        let resp = app
+            .clone()
+            .oneshot(Request::get(&uri).body(Body::empty()).unwrap())
+            .await
+            .unwrap();
+        assert_eq!(resp.status(), 200);
+        assert_eq!(resp.headers()["vary"], "accept-encoding");
+        let etag = resp.headers()["etag"].clone();
+
+        let resp = app
+            .oneshot(
+                Request::get(&uri)
+                    .header("if-none-match", etag)
+                    .body(Body::empty())
+                    .unwrap(),
+            )
+            .await
+            .unwrap();
+        assert_eq!(resp.status(), 304);
+        assert_eq!(resp.headers()["vary"], "accept-encoding");
+
+        state.s3.delete_object(&key).await.unwrap();
+    }
+
+    #[tokio::test]
+    async fn test_failed_bom_store_removes_metadata() {
+        let state = test_state().await;
+        let id = uuid::Uuid::new_v4().to_string();
+        // On the filesystem backend, an object nested under the pcbdata key
+        // turns that key into a directory, so the pcbdata write fails.
+        let blocker = format!("boms/{id}.json/blocker");
+        state
+            .s3
+            .put_object(&blocker, b"x".to_vec(), "text/plain")
+            .await
+            .unwrap();
+
+        let result = routes::store_bom(
+            &state,
+            &id,
+            axum::body::Bytes::from_static(b"{}"),
+            Some(b"{}".to_vec()),
+        )
+        .await;
+        assert!(result.is_err());
+        assert!(
+            !state
+                .s3
+                .object_exists(&format!("boms/{id}.meta.json"))
+                .await
+        );
+        assert!(!state.known_boms.contains(id.as_str()));
+
+        state.s3.delete_object(&blocker).await.unwrap();
+    }
+
+    #[tokio::test]
+    async fn test_parse_cache_hit_skips_parsing() {
+        let state = test_state().await;
+        let upload = axum::body::Bytes::from_static(include_bytes!(
+            "../../pcb-extract/test-fixtures/eagle-binary/grove-button.brd"
+        ));
+        let format = pcb_extract::detect_format_with_content(
+            std::path::Path::new("grove-button.brd"),
+            &upload,
+        )
+        .unwrap();
+
+        let first = routes::parse_pcb_guarded(&state, upload.clone(), format)
+            .await
+            .unwrap();
+        assert!(first.data.is_some(), "first upload must be parsed");
+
+        let second = routes::parse_pcb_guarded(&state, upload, format)
+            .await
+            .unwrap();
+        assert!(second.data.is_none(), "repeat upload must come from cache");
+        assert_eq!(second.bom.components, first.bom.components);
+        assert_eq!(second.bom.pcbdata_gz, first.bom.pcbdata_gz);
+    }
+
     #[tokio::test]
     async fn test_gds_invalid_id_is_404() {
         let app = build_app(test_state().await);
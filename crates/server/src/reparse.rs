@@ -153,15 +153,23 @@ async fn check_and_reparse(
         return ReparseResult::Current;
     }
 
-    // Load just the parser_version field
+    // Load just the parser_version field. Gzipped boms are probed through a
+    // streaming decompressor, so only the stored (compressed) bytes are held.
     let json_bytes = match s3.get_object(&bom_key).await {
         Ok(b) => b,
         Err(_) => return ReparseResult::Failed("could not read bom json".into()),
     };
 
-    let probe: VersionProbe = match serde_json::from_slice(&json_bytes) {
-        Ok(p) => p,
-        Err(_) => return ReparseResult::Failed("could not parse bom json".into()),
+    // Decompressing and scanning a multi-MB bom is CPU-bound, so keep it off
+    // the runtime.
+    let probe = tokio::task::spawn_blocking(move || {
+        crate::s3::from_stored_json::<VersionProbe>(&json_bytes)
+    })
+    .await;
+    let probe = match probe {
+        Ok(Ok(p)) => p,
+        Ok(Err(_)) => return ReparseResult::Failed("could not parse bom json".into()),
+        Err(_) => return ReparseResult::Failed("probe task panicked".into()),
     };
 
     // Skip formats no longer supported on the site
@@ -231,31 +239,27 @@ async fn check_and_reparse(
         None => return ReparseResult::Skipped("could not detect format".into()),
     };
 
-    let pcb_data = match tokio::task::spawn_blocking(move || {
+    // Parse and serialize on the blocking thread; only the JSON is needed here.
+    let pcbdata_json = match tokio::task::spawn_blocking(move || {
         let opts = ExtractOptions {
             include_tracks: true,
             include_nets: true,
         };
-        pcb_extract::extract_bytes(&upload_data, format, &opts)
+        let pcb_data = pcb_extract::extract_bytes(&upload_data, format, &opts)
+            .map_err(|e| format!("parse error: {e}"))?;
+        serde_json::to_vec(&pcb_data).map_err(|_| "json serialization failed".to_string())
     })
     .await
     {
-        Ok(Ok(data)) => data,
-        Ok(Err(e)) => return ReparseResult::Failed(format!("parse error: {e}")),
+        Ok(Ok(json)) => json,
+        Ok(Err(msg)) => return ReparseResult::Failed(msg),
         Err(_) => return ReparseResult::Failed("parse task panicked".into()),
     };
 
     // Store updated pcbdata
-    let pcbdata_json = match serde_json::to_vec(&pcb_data) {
-        Ok(j) => j,
-        Err(_) => return ReparseResult::Failed("json serialization failed".into()),
-    };
     let parsed_bytes = pcbdata_json.len();
 
-    if let Err(e) = s3
-        .put_object(&bom_key, pcbdata_json, "application/json")
-        .await
-    {
+    if let Err(e) = s3.put_json_gzip(&bom_key, pcbdata_json).await {
         return ReparseResult::Failed(format!("could not store updated bom: {e}"));
     }
 
@@ -1,12 +1,14 @@
 use axum::{
+    body::Bytes,
     extract::{multipart::MultipartRejection, DefaultBodyLimit, Multipart, Path, State},
-    http::StatusCode,
-    response::{Html, IntoResponse},
+    http::{header, HeaderMap, StatusCode},
+    response::{Html, IntoResponse, Response},
     routing::{get, post},
     Json, Router,
 };
 use pcb_extract::ExtractOptions;
 use serde::{Deserialize, Serialize};
+use sha2::{Digest, Sha256};
 use uuid::Uuid;
 
 use crate::AppState;
@@ -15,33 +17,95 @@ const MAX_RECENT: usize = 50;
 const RECENT_KEY: &str = "recent.json";
 const SEMAPHORE_TIMEOUT: std::time::Duration = std::time::Duration::from_secs(30);
 const PARSE_TIMEOUT: std::time::Duration = std::time::Duration::from_secs(60);
+/// Capacity of the in-process set of BOM ids known to exist in storage.
+pub const MAX_KNOWN_BOMS: usize = 10_000;
+/// Memory budget for parse results kept for reuse when the same file is
+/// uploaded again, measured by their gzipped pcbdata.
+pub const MAX_CACHED_PARSE_BYTES: usize = 64 * 1024 * 1024;
+/// Metadata is written once at upload and never rewritten.
+const IMMUTABLE: &str = "public, max-age=31536000, immutable";
+/// pcbdata can be rewritten by a background re-parse, so caches revalidate
+/// against its ETag instead of holding it for a fixed time.
+const REVALIDATE: &str = "public, no-cache";
+
+/// What storing a BOM needs from a parse: the gzipped pcbdata, ready to
+/// store as-is, and the component count for its metadata. Cheap to clone.
+#[derive(Clone)]
+pub struct PreparedBom {
+    pub components: usize,
+    pub pcbdata_gz: Bytes,
+}
+
+/// Result of [`parse_pcb_guarded`].
+pub struct ParsedPcb {
+    pub bom: PreparedBom,
+    /// The board itself; `None` when the result came from the parse cache.
+    pub data: Option<pcb_extract::types::PcbData>,
+}
+
+/// Cache key for a parse: hex SHA-256 of the uploaded bytes plus the format
+/// they were parsed as.
+pub type ParseKey = (String, pcb_extract::PcbFormat);
 
-/// Acquire parse semaphore (with timeout) and run PCB extraction off the async runtime.
+/// Compute the [`ParseKey`] for an upload. CPU-bound for large files, so call
+/// it from a blocking context.
+pub fn parse_key(data: &[u8], format: pcb_extract::PcbFormat) -> ParseKey {
+    (hex::encode(Sha256::digest(data)), format)
+}
+
+/// Acquire parse semaphore (with timeout) and run PCB extraction off the async
+/// runtime. The pcbdata JSON is serialized and gzipped on the same blocking
+/// thread, since for large boards that costs about as much CPU as the parse.
+///
+/// Prepared BOMs are cached by content hash, so re-uploading an identical
+/// file skips parsing, serialization and compression entirely.
 pub async fn parse_pcb_guarded(
     state: &AppState,
-    data: Vec<u8>,
+    data: Bytes,
     format: pcb_extract::PcbFormat,
-) -> Result<pcb_extract::types::PcbData, String> {
+) -> Result<ParsedPcb, String> {
+    let hash_input = data.clone();
+    let key = tokio::task::spawn_blocking(move || parse_key(&hash_input, format))
+        .await
+        .map_err(|_| "Parse task failed".to_string())?;
+    if let Some(bom) = state.parsed_pcbs.get(&key) {
+        return Ok(ParsedPcb { bom, data: None });
+    }
+
     let _permit = tokio::time::timeout(SEMAPHORE_TIMEOUT, state.parse_semaphore.acquire())
         .await
         .map_err(|_| "Server busy — try again later".to_string())?
         .map_err(|_| "Server busy".to_string())?;
-    let handle = tokio::task::spawn_blocking(move || {
+    let handle = tokio::task::spawn_blocking(move || -> Result<ParsedPcb, String> {
         let opts = ExtractOptions {
             include_tracks: true,
             include_nets: true,
         };
-        pcb_extract::extract_bytes(&data, format, &opts)
+        let pcb_data = pcb_extract::extract_bytes(&data, format, &opts)
+            .map_err(|e| format!("Failed to parse PCB file: {e}"))?;
+        let json =
+            serde_json::to_vec(&pcb_data).map_err(|_| "JSON serialization failed".to_string())?;
+        Ok(ParsedPcb {
+            bom: PreparedBom {
+                components: pcb_data.footprints.len(),
+                pcbdata_gz: crate::s3::gzip(&json).into(),
+            },
+            data: Some(pcb_data),
+        })
     });
     // Bound parse wall-clock time so a pathological file can't hold the permit
     // indefinitely. On timeout the permit is released here; the blocking task
     // finishes on its own (parser work is itself bounded).
-    let result = tokio::time::timeout(PARSE_TIMEOUT, handle)
+    let parsed = tokio::time::timeout(PARSE_TIMEOUT, handle)
         .await
         .map_err(|_| "Parsing timed out".to_string())?
-        .map_err(|_| "Parse task failed".to_string())?
-        .map_err(|e| format!("Failed to parse PCB file: {e}"))?;
-    Ok(result)
+        .map_err(|_| "Parse task failed".to_string())??;
+
+    let weight = parsed.bom.pcbdata_gz.len();
+    state
+        .parsed_pcbs
+        .insert_weighted(key, parsed.bom.clone(), weight);
+    Ok(parsed)
 }
 
 /// Prepend an entry to the recent list and persist to storage.
@@ -131,6 +195,39 @@ pub async fn load_recent(s3: &crate::s3::S3Client) -> Vec<RecentEntry> {
     entries
 }
 
+/// Store a BOM's gzipped pcbdata and its metadata, then record the id in
+/// `known_boms`. The two objects are independent, so they are written
+/// concurrently; if the pcbdata write fails the metadata is deleted again,
+/// since [`reconstruct_recent`] lists BOMs by their `.meta.json`.
+pub async fn store_bom(
+    state: &AppState,
+    id: &str,
+    pcbdata_gz: Bytes,
+    meta_json: Option<Vec<u8>>,
+) -> Result<(), crate::s3::S3Error> {
+    let bom_key = format!("boms/{id}.json");
+    let meta_key = format!("boms/{id}.meta.json");
+    let (bom_result, meta_stored) =
+        tokio::join!(state.s3.put_gzipped_json(&bom_key, pcbdata_gz), async {
+            match meta_json {
+                Some(meta_json) => state
+                    .s3
+                    .put_object(&meta_key, meta_json, "application/json")
+                    .await
+                    .is_ok(),
+                None => false,
+            }
+        });
+    if let Err(e) = bom_result {
+        if meta_stored {
+            let _ = state.s3.delete_object(&meta_key).await;
+        }
+        return Err(e);
+    }
+    state.known_boms.insert(id.to_string(), ());
+    Ok(())
+}
+
 async fn reconstruct_recent(s3: &crate::s3::S3Client) -> Vec<RecentEntry> {
     let objects = match s3.list_objects("boms/").await {
         Ok(objs) => objs,
@@ -188,8 +285,11 @@ pub fn router(max_upload_bytes: usize) -> Router<AppState> {
             "/g/{id}/tiles/{z}/{x}/{y}/{key}",
             get(crate::gdsii_tiles::get_gds_tile),
         )
-        .route("/gview/{*path}", get(crate::gdsii_tiles::serve_gview))
-        .route("/gview/", get(crate::gdsii_tiles::serve_gview))
+        .route(
+            "/gview/{*path}",
+            get(crate::compressed_assets::serve_gds_viewer),
+        )
+        .route("/gview/", get(crate::compressed_assets::serve_gds_viewer))
         .route("/health", get(health))
         .layer(DefaultBodyLimit::max(max_upload_bytes))
 }
@@ -242,7 +342,7 @@ async fn upload(
 ) -> Result<impl IntoResponse, (StatusCode, Json<ErrorResponse>)> {
     let mut multipart = multipart_result
         .map_err(|e| error_response(StatusCode::BAD_REQUEST, &format!("Upload error: {e}")))?;
-    let mut file_data: Option<(String, Vec<u8>)> = None;
+    let mut file_data: Option<(String, Bytes)> = None;
     let mut secret = false;
 
     while let Ok(Some(mut field)) = multipart.next_field().await {
@@ -265,7 +365,7 @@ async fn upload(
                     ));
                 }
             }
-            file_data = Some((filename, data));
+            file_data = Some((filename, Bytes::from(data)));
         } else if name == "secret" {
             let val = field.text().await.unwrap_or_default();
             secret = val == "true";
@@ -285,10 +385,8 @@ async fn upload(
                 tracing::error!("GDSII ingest error for {filename}: {e}");
                 error_response(StatusCode::UNPROCESSABLE_ENTITY, &e)
             })?;
-        let base_url =
-            std::env::var("BASE_URL").unwrap_or_else(|_| "http://localhost:8000".to_string());
         return Ok(Json(UploadResponse {
-            url: format!("{base_url}/g/{id}"),
+            url: format!("{}/g/{id}", state.base_url),
             id,
             filename,
             components: 0,
@@ -303,48 +401,33 @@ async fn upload(
     let id = Uuid::new_v4().to_string();
 
     // Always store the original upload first (sanitize the client filename so
-    // it can't escape the upload directory on the filesystem backend).
+    // it can't escape the upload directory on the filesystem backend). `data`
+    // is a shared buffer, so archiving it doesn't copy the upload.
     let upload_key = format!("uploads/{id}/{}", safe_filename(&filename));
     let _ = state
         .s3
         .put_object(&upload_key, data.clone(), "application/octet-stream")
         .await;
 
-    let pcb_data = parse_pcb_guarded(&state, data, format).await.map_err(|e| {
+    let parsed = parse_pcb_guarded(&state, data, format).await.map_err(|e| {
         tracing::error!("Parse error for {filename}: {e}");
         error_response(StatusCode::UNPROCESSABLE_ENTITY, &e)
     })?;
 
-    let component_count = pcb_data.footprints.len();
+    let component_count = parsed.bom.components;
 
-    // Store pcbdata as JSON
-    let pcbdata_json = serde_json::to_vec(&pcb_data).map_err(|_| {
-        error_response(
-            StatusCode::INTERNAL_SERVER_ERROR,
-            "JSON serialization failed",
-        )
-    })?;
-    let bom_key = format!("boms/{id}.json");
-    state
-        .s3
-        .put_object(&bom_key, pcbdata_json, "application/json")
-        .await
-        .map_err(|_| error_response(StatusCode::INTERNAL_SERVER_ERROR, "Failed to store BOM"))?;
-
-    // Store metadata
     let meta = BomMeta {
         id: id.clone(),
         filename: filename.clone(),
         components: component_count,
         file_size,
     };
-    let meta_key = format!("boms/{id}.meta.json");
-    if let Ok(meta_json) = serde_json::to_vec(&meta) {
-        let _ = state
-            .s3
-            .put_object(&meta_key, meta_json, "application/json")
-            .await;
-    }
+    let meta_json = serde_json::to_vec(&meta).ok();
+
+    // Store the pcbdata (gzipped during the parse) and its metadata
+    store_bom(&state, &id, parsed.bom.pcbdata_gz, meta_json)
+        .await
+        .map_err(|_| error_response(StatusCode::INTERNAL_SERVER_ERROR, "Failed to store BOM"))?;
 
     if !secret {
         add_recent(
@@ -360,10 +443,8 @@ async fn upload(
         .await;
     }
 
-    let base_url =
-        std::env::var("BASE_URL").unwrap_or_else(|_| "http://localhost:8000".to_string());
     Ok(Json(UploadResponse {
-        url: format!("{base_url}/b/{id}"),
+        url: format!("{}/b/{id}", state.base_url),
         id,
         filename,
         components: component_count,
@@ -379,41 +460,116 @@ async fn get_recent(State(state): State<AppState>) -> Json<Vec<RecentEntry>> {
 async fn get_bom(
     State(state): State<AppState>,
     Path(id): Path<String>,
+    headers: HeaderMap,
 ) -> Result<impl IntoResponse, (StatusCode, Json<ErrorResponse>)> {
     validate_id(&id)?;
-    // Verify the BOM exists
-    let key = format!("boms/{id}.json");
-    let _ = state
-        .s3
-        .get_object(&key)
-        .await
-        .map_err(|_| error_response(StatusCode::NOT_FOUND, "BOM not found"))?;
+    // Verify the BOM exists without downloading the pcbdata itself. BOMs are
+    // never deleted, so ids stored or seen by this process skip the check.
+    if !state.known_boms.contains(id.as_str()) {
+        let key = format!("boms/{id}.json");
+        if !state.s3.object_exists(&key).await {
+            return Err(error_response(StatusCode::NOT_FOUND, "BOM not found"));
+        }
+        state.known_boms.insert(id, ());
+    }
 
-    // Serve the viewer index.html
-    let index_path = state.viewer_dir.join("index.html");
-    let html = tokio::fs::read_to_string(&index_path)
-        .await
-        .map_err(|_| error_response(StatusCode::INTERNAL_SERVER_ERROR, "Viewer not available"))?;
-    Ok(Html(html))
+    // Serve the viewer index.html from the pre-compressed startup cache
+    crate::compressed_assets::index_response(&headers)
+        .ok_or_else(|| error_response(StatusCode::INTERNAL_SERVER_ERROR, "Viewer not available"))
 }
 
-/// Serve pcbdata JSON at /b/{id}/data
+/// Serve pcbdata JSON at /b/{id}/data. Gzipped objects are passed through
+/// as-is to clients that accept gzip and decompressed for the rest.
 async fn get_bom_data(
     State(state): State<AppState>,
     Path(id): Path<String>,
-) -> Result<impl IntoResponse, (StatusCode, Json<ErrorResponse>)> {
+    headers: HeaderMap,
+) -> Result<Response, (StatusCode, Json<ErrorResponse>)> {
     validate_id(&id)?;
     let key = format!("boms/{id}.json");
-    let json_bytes = state
+
+    // The storage version tag is the validator, so a revalidation is answered
+    // from a HEAD without downloading the object. The ETag is weak because
+    // the same object may be sent gzipped or decoded.
+    if headers.contains_key(header::IF_NONE_MATCH) {
+        if let Some(version) = state.s3.object_version(&key).await {
+            if etag_matches(&headers, &version) {
+                let etag = format!("W/\"{version}\"");
+                return Ok((
+                    StatusCode::NOT_MODIFIED,
+                    [
+                        (header::VARY, "accept-encoding"),
+                        (header::ETAG, etag.as_str()),
+                        (header::CACHE_CONTROL, REVALIDATE),
+                    ],
+                )
+                    .into_response());
+            }
+        }
+    }
+
+    let (stored, version) = state
         .s3
-        .get_object(&key)
+        .get_object_versioned(&key)
         .await
         .map_err(|_| error_response(StatusCode::NOT_FOUND, "BOM not found"))?;
+    let etag = format!("W/\"{version}\"");
+
+    let accepts_gzip = headers
+        .get(header::ACCEPT_ENCODING)
+        .and_then(|v| v.to_str().ok())
+        .is_some_and(|v| v.contains("gzip"));
+    if accepts_gzip && crate::s3::is_gzip(&stored) {
+        return Ok((
+            StatusCode::OK,
+            [
+                (header::CONTENT_TYPE, "application/json"),
+                (header::CONTENT_ENCODING, "gzip"),
+                (header::VARY, "accept-encoding"),
+                (header::ETAG, etag.as_str()),
+                (header::CACHE_CONTROL, REVALIDATE),
+            ],
+            stored,
+        )
+            .into_response());
+    }
+
+    // Gunzipping a multi-MB board is CPU-bound, so keep it off the runtime.
+    let json_bytes = tokio::task::spawn_blocking(move || crate::s3::decode_stored(stored))
+        .await
+        .map_err(|_| error_response(StatusCode::INTERNAL_SERVER_ERROR, "Decode failed"))?
+        .map_err(|_| error_response(StatusCode::INTERNAL_SERVER_ERROR, "Invalid BOM data"))?;
     Ok((
         StatusCode::OK,
-        [("content-type", "application/json")],
+        [
+            (header::CONTENT_TYPE, "application/json"),
+            (header::VARY, "accept-encoding"),
+            (header::ETAG, etag.as_str()),
+            (header::CACHE_CONTROL, REVALIDATE),
+        ],
         json_bytes,
-    ))
+    )
+        .into_response())
+}
+
+/// True when the request's `If-None-Match` lists the opaque entity tag `tag`
+/// (given without quotes). Uses weak comparison, so `W/"tag"` and `"tag"`
+/// both match, as does `*`.
+pub fn etag_matches(headers: &HeaderMap, tag: &str) -> bool {
+    headers
+        .get_all(header::IF_NONE_MATCH)
+        .iter()
+        .filter_map(|v| v.to_str().ok())
+        .flat_map(|v| v.split(','))
+        .map(str::trim)
+        .any(|candidate| {
+            let candidate = candidate.strip_prefix("W/").unwrap_or(candidate);
+            candidate == "*"
+                || candidate
+                    .strip_prefix('"')
+                    .and_then(|c| c.strip_suffix('"'))
+                    == Some(tag)
+        })
 }
 
 async fn get_meta(
@@ -429,7 +585,7 @@ async fn get_meta(
         .map_err(|_| error_response(StatusCode::NOT_FOUND, "BOM not found"))?;
     let meta: BomMeta = serde_json::from_slice(&meta_bytes)
         .map_err(|_| error_response(StatusCode::INTERNAL_SERVER_ERROR, "Invalid metadata"))?;
-    Ok(Json(meta))
+    Ok(([(header::CACHE_CONTROL, IMMUTABLE)], Json(meta)))
 }
 
 /// Serve SVG thumbnail at /b/{id}/thumb.svg with S3 pull-through cache.
@@ -448,7 +604,7 @@ async fn get_thumb_svg(
                 ("content-type", "image/svg+xml"),
                 ("cache-control", "public, max-age=86400"),
             ],
-            cached,
+            Bytes::from(cached),
         ));
     }
 
@@ -460,18 +616,24 @@ async fn get_thumb_svg(
         .await
         .map_err(|_| error_response(StatusCode::NOT_FOUND, "BOM not found"))?;
 
-    let pcb_data: pcb_extract::types::PcbData =
-        serde_json::from_slice(&json_bytes).map_err(|_| {
-            error_response(
-                StatusCode::INTERNAL_SERVER_ERROR,
-                "Failed to parse BOM data",
-            )
-        })?;
-
-    let svg = tokio::task::spawn_blocking(move || pcb_extract::thumbnail::render_svg(&pcb_data))
-        .await
-        .map_err(|_| error_response(StatusCode::INTERNAL_SERVER_ERROR, "Render failed"))?;
-    let svg_bytes = svg.into_bytes();
+    // Decompressing and decoding a multi-MB PcbData is as CPU-heavy as
+    // rendering it, so do all of it off the async runtime.
+    let svg = tokio::task::spawn_blocking(move || {
+        crate::s3::decode_stored(json_bytes)
+            .ok()
+            .and_then(|json| serde_json::from_slice::<pcb_extract::types::PcbData>(&json).ok())
+            .map(|pcb_data| pcb_extract::thumbnail::render_svg(&pcb_data))
+    })
+    .await
+    .map_err(|_| error_response(StatusCode::INTERNAL_SERVER_ERROR, "Render failed"))?
+    .ok_or_else(|| {
+        error_response(
+            StatusCode::INTERNAL_SERVER_ERROR,
+            "Failed to parse BOM data",
+        )
+    })?;
+    // One shared buffer backs both the cache write and the response.
+    let svg_bytes = Bytes::from(svg);
 
     // Store in cache (fire and forget)
     let s3 = state.s3.clone();
@@ -531,4 +693,20 @@ mod tests {
         assert!(validate_id("not-a-uuid").is_err());
         assert!(validate_id("../boms/secret").is_err());
     }
+
+    #[test]
+    fn etag_matches_if_none_match_lists() {
+        let with = |value: &str| {
+            let mut headers = HeaderMap::new();
+            headers.insert(header::IF_NONE_MATCH, value.parse().unwrap());
+            headers
+        };
+        assert!(etag_matches(&with("\"abc\""), "abc"));
+        assert!(etag_matches(&with("W/\"abc\""), "abc"));
+        assert!(etag_matches(&with("\"x\", W/\"abc\""), "abc"));
+        assert!(etag_matches(&with("*"), "abc"));
+        assert!(!etag_matches(&with("\"abcd\""), "abc"));
+        assert!(!etag_matches(&with("abc"), "abc"));
+        assert!(!etag_matches(&HeaderMap::new(), "abc"));
+    }
 }
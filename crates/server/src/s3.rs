@@ -1,4 +1,18 @@
+use std::io::{BufReader, Read, Write};
 use std::path::PathBuf;
+use std::time::Duration;
+
+use axum::body::Bytes;
+use serde::de::DeserializeOwned;
+
+/// Leading bytes of a gzip stream. Stored pcbdata is gzip-compressed, but
+/// objects written before that are plain JSON, so readers sniff the header.
+const GZIP_MAGIC: [u8; 2] = [0x1f, 0x8b];
+
+/// Fail fast on an unreachable S3 endpoint.
+const S3_CONNECT_TIMEOUT: Duration = Duration::from_secs(2);
+/// Upper bound on waiting for response bytes from S3.
+const S3_READ_TIMEOUT: Duration = Duration::from_secs(30);
 
 pub struct ObjectInfo {
     pub key: String,
@@ -37,7 +51,17 @@ impl std::error::Error for S3Error {}
 impl S3Client {
     pub async fn from_env() -> Self {
         if let Ok(bucket) = std::env::var("S3_BUCKET") {
-            let config = aws_config::load_defaults(aws_config::BehaviorVersion::latest()).await;
+            // The SDK's HTTP client pools and reuses keep-alive connections
+            // across requests; bound how long a bad connection can stall one.
+            let config = aws_config::defaults(aws_config::BehaviorVersion::latest())
+                .timeout_config(
+                    aws_config::timeout::TimeoutConfig::builder()
+                        .connect_timeout(S3_CONNECT_TIMEOUT)
+                        .read_timeout(S3_READ_TIMEOUT)
+                        .build(),
+                )
+                .load()
+                .await;
             let client = aws_sdk_s3::Client::new(&config);
             let prefix = std::env::var("S3_PREFIX").unwrap_or_default();
             tracing::info!("Using S3 storage: bucket={bucket}");
@@ -60,11 +84,46 @@ impl S3Client {
         }
     }
 
+    /// Store `body` under `path`. Accepts anything convertible to [`Bytes`] so
+    /// callers holding a shared buffer can store it without copying.
     pub async fn put_object(
         &self,
         path: &str,
-        body: Vec<u8>,
+        body: impl Into<Bytes>,
         content_type: &str,
+    ) -> Result<(), S3Error> {
+        self.put_object_encoded(path, body.into(), content_type, None)
+            .await
+    }
+
+    /// Gzip `json` off the async runtime and store it with
+    /// `Content-Encoding: gzip`. Read it back through [`decode_stored`] or
+    /// [`from_stored_json`].
+    pub async fn put_json_gzip(&self, path: &str, json: impl Into<Bytes>) -> Result<(), S3Error> {
+        let json = json.into();
+        let body = tokio::task::spawn_blocking(move || gzip(&json))
+            .await
+            .map_err(|_| S3Error("gzip task failed".to_string()))?;
+        self.put_gzipped_json(path, body).await
+    }
+
+    /// Store JSON that the caller has already gzipped (see [`gzip`]) with
+    /// `Content-Encoding: gzip`.
+    pub async fn put_gzipped_json(
+        &self,
+        path: &str,
+        body: impl Into<Bytes>,
+    ) -> Result<(), S3Error> {
+        self.put_object_encoded(path, body.into(), "application/json", Some("gzip"))
+            .await
+    }
+
+    async fn put_object_encoded(
+        &self,
+        path: &str,
+        body: Bytes,
+        content_type: &str,
+        content_encoding: Option<&str>,
     ) -> Result<(), S3Error> {
         match &self.backend {
             StorageBackend::S3 {
@@ -79,6 +138,7 @@ impl S3Client {
                     .key(key)
                     .body(body.into())
                     .content_type(content_type)
+                    .set_content_encoding(content_encoding.map(str::to_string))
                     .send()
                     .await
                     .map_err(|e| S3Error(e.to_string()))?;
@@ -87,10 +147,12 @@ impl S3Client {
             StorageBackend::Filesystem { root } => {
                 let file_path = root.join(path);
                 if let Some(parent) = file_path.parent() {
-                    std::fs::create_dir_all(parent)
+                    tokio::fs::create_dir_all(parent)
+                        .await
                         .map_err(|e| S3Error(format!("mkdir failed: {e}")))?;
                 }
-                std::fs::write(&file_path, &body)
+                tokio::fs::write(&file_path, body)
+                    .await
                     .map_err(|e| S3Error(format!("write failed: {e}")))?;
                 Ok(())
             }
@@ -146,28 +208,29 @@ impl S3Client {
             StorageBackend::Filesystem { root } => {
                 let dir = root.join(prefix);
                 let mut objects = Vec::new();
-                if let Ok(entries) = std::fs::read_dir(&dir) {
-                    for entry in entries.flatten() {
-                        let path = entry.path();
-                        if path.is_file() {
-                            let key = format!(
-                                "{}/{}",
-                                prefix.trim_end_matches('/'),
-                                entry.file_name().to_string_lossy()
-                            );
-                            let metadata = entry.metadata().ok();
-                            let last_modified = metadata
-                                .as_ref()
-                                .and_then(|m| m.modified().ok())
-                                .map(chrono::DateTime::<chrono::Utc>::from)
-                                .unwrap_or_else(chrono::Utc::now);
-                            let size = metadata.as_ref().map(|m| m.len()).unwrap_or(0);
-                            objects.push(ObjectInfo {
-                                key,
-                                last_modified,
-                                size,
-                            });
+                if let Ok(mut entries) = tokio::fs::read_dir(&dir).await {
+                    while let Ok(Some(entry)) = entries.next_entry().await {
+                        let Ok(metadata) = entry.metadata().await else {
+                            continue;
+                        };
+                        if !metadata.is_file() {
+                            continue;
                         }
+                        let key = format!(
+                            "{}/{}",
+                            prefix.trim_end_matches('/'),
+                            entry.file_name().to_string_lossy()
+                        );
+                        let last_modified = metadata
+                            .modified()
+                            .ok()
+                            .map(chrono::DateTime::<chrono::Utc>::from)
+                            .unwrap_or_else(chrono::Utc::now);
+                        objects.push(ObjectInfo {
+                            key,
+                            last_modified,
+                            size: metadata.len(),
+                        });
                     }
                 }
                 Ok(objects)
@@ -194,16 +257,53 @@ impl S3Client {
             }
             StorageBackend::Filesystem { root } => {
                 let file_path = root.join(path);
-                if file_path.exists() {
-                    std::fs::remove_file(&file_path)
-                        .map_err(|e| S3Error(format!("delete failed: {e}")))?;
+                match tokio::fs::remove_file(&file_path).await {
+                    Ok(()) => Ok(()),
+                    Err(e) if e.kind() == std::io::ErrorKind::NotFound => Ok(()),
+                    Err(e) => Err(S3Error(format!("delete failed: {e}"))),
                 }
-                Ok(())
             }
         }
     }
 
+    /// Check whether an object exists without downloading its body.
+    pub async fn object_exists(&self, path: &str) -> bool {
+        self.object_version(path).await.is_some()
+    }
+
+    /// Version tag of an object without downloading its body, or `None` when
+    /// it doesn't exist. The tag changes whenever the object is rewritten: it
+    /// is the S3 `ETag` (unquoted), or the file's size and mtime on the
+    /// filesystem backend.
+    pub async fn object_version(&self, path: &str) -> Option<String> {
+        match &self.backend {
+            StorageBackend::S3 {
+                client,
+                bucket,
+                prefix,
+            } => client
+                .head_object()
+                .bucket(bucket)
+                .key(s3_key(prefix, path))
+                .send()
+                .await
+                .ok()
+                .map(|resp| unquote_etag(resp.e_tag())),
+            StorageBackend::Filesystem { root } => tokio::fs::metadata(root.join(path))
+                .await
+                .ok()
+                .filter(|m| m.is_file())
+                .map(|m| file_version(&m)),
+        }
+    }
+
     pub async fn get_object(&self, path: &str) -> Result<Vec<u8>, S3Error> {
+        self.get_object_versioned(path).await.map(|(body, _)| body)
+    }
+
+    /// Like [`get_object`](Self::get_object), also returning the object's
+    /// version tag (see [`object_version`](Self::object_version)).
+    pub async fn get_object_versioned(&self, path: &str) -> Result<(Vec<u8>, String), S3Error> {
         match &self.backend {
             StorageBackend::S3 {
                 client,
@@ -218,21 +318,81 @@ impl S3Client {
                     .send()
                     .await
                     .map_err(|e| S3Error(e.to_string()))?;
+                let version = unquote_etag(resp.e_tag());
                 let bytes = resp
                     .body
                     .collect()
                     .await
                     .map_err(|e| S3Error(e.to_string()))?;
-                Ok(bytes.to_vec())
+                Ok((bytes.to_vec(), version))
             }
             StorageBackend::Filesystem { root } => {
                 let file_path = root.join(path);
-                std::fs::read(&file_path).map_err(|e| S3Error(format!("read failed: {e}")))
+                let metadata = tokio::fs::metadata(&file_path)
+                    .await
+                    .map_err(|e| S3Error(format!("read failed: {e}")))?;
+                let body = tokio::fs::read(&file_path)
+                    .await
+                    .map_err(|e| S3Error(format!("read failed: {e}")))?;
+                Ok((body, file_version(&metadata)))
             }
         }
     }
 }
 
+fn unquote_etag(etag: Option<&str>) -> String {
+    etag.unwrap_or_default().trim_matches('"').to_string()
+}
+
+/// Filesystem stand-in for an S3 `ETag`: size and modification time.
+fn file_version(metadata: &std::fs::Metadata) -> String {
+    let mtime = metadata
+        .modified()
+        .ok()
+        .and_then(|t| t.duration_since(std::time::UNIX_EPOCH).ok())
+        .unwrap_or_default();
+    format!("{:x}-{:x}", metadata.len(), mtime.as_nanos())
+}
+
+/// True when `data` is a gzip stream.
+pub fn is_gzip(data: &[u8]) -> bool {
+    data.starts_with(&GZIP_MAGIC)
+}
+
+/// Gzip-compress `data` at the default level. CPU-bound for large bodies, so
+/// call it from a blocking context.
+pub fn gzip(data: &[u8]) -> Vec<u8> {
+    let mut encoder = flate2::write::GzEncoder::new(
+        Vec::with_capacity(data.len() / 4),
+        flate2::Compression::default(),
+    );
+    // Writes into a Vec cannot fail.
+    encoder.write_all(data).unwrap();
+    encoder.finish().unwrap()
+}
+
+/// Plain bytes of a stored object: decompressed if gzipped, as-is otherwise.
+pub fn decode_stored(data: Vec<u8>) -> Result<Vec<u8>, S3Error> {
+    if !is_gzip(&data) {
+        return Ok(data);
+    }
+    let mut out = Vec::with_capacity(data.len() * 4);
+    flate2::read::GzDecoder::new(data.as_slice())
+        .read_to_end(&mut out)
+        .map_err(|e| S3Error(format!("gunzip failed: {e}")))?;
+    Ok(out)
+}
+
+/// Deserialize a stored JSON object, streaming through the decompressor when
+/// it is gzipped so the expanded document is never held in memory.
+pub fn from_stored_json<T: DeserializeOwned>(data: &[u8]) -> serde_json::Result<T> {
+    if is_gzip(data) {
+        serde_json::from_reader(BufReader::new(flate2::read::GzDecoder::new(data)))
+    } else {
+        serde_json::from_slice(data)
+    }
+}
+
 fn s3_key(prefix: &str, path: &str) -> String {
     if prefix.is_empty() {
         path.to_string()
@@ -240,3 +400,72 @@ fn s3_key(prefix: &str, path: &str) -> String {
         format!("{}/{}", prefix.trim_end_matches('/'), path)
     }
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    fn temp_client() -> (S3Client, PathBuf) {
+        let root = std::env::temp_dir().join(format!("pastebom-s3-{}", uuid::Uuid::new_v4()));
+        let client = S3Client {
+            backend: StorageBackend::Filesystem { root: root.clone() },
+        };
+        (client, root)
+    }
+
+    #[tokio::test]
+    async fn filesystem_backend_roundtrip() {
+        let (s3, root) = temp_client();
+        s3.put_object("boms/a.json", b"{}".to_vec(), "application/json")
+            .await
+            .unwrap();
+        assert_eq!(s3.get_object("boms/a.json").await.unwrap(), b"{}");
+        assert!(s3.object_exists("boms/a.json").await);
+        assert!(!s3.object_exists("boms/missing.json").await);
+        assert!(!s3.object_exists("boms").await);
+
+        let version = s3.object_version("boms/a.json").await.unwrap();
+        let (_, read_version) = s3.get_object_versioned("boms/a.json").await.unwrap();
+        assert_eq!(read_version, version);
+        s3.put_object("boms/a.json", b"{ }".to_vec(), "application/json")
+            .await
+            .unwrap();
+        assert_ne!(s3.object_version("boms/a.json").await.unwrap(), version);
+
+        let listed = s3.list_objects("boms/").await.unwrap();
+        assert_eq!(listed.len(), 1);
+        assert_eq!(listed[0].key, "boms/a.json");
+        assert_eq!(listed[0].size, 3);
+
+        s3.delete_object("boms/a.json").await.unwrap();
+        assert!(s3.get_object("boms/a.json").await.is_err());
+        // Deleting a missing object is not an error.
+        s3.delete_object("boms/a.json").await.unwrap();
+
+        let _ = std::fs::remove_dir_all(root);
+    }
+
+    #[tokio::test]
+    async fn gzip_json_roundtrip() {
+        let (s3, root) = temp_client();
+        let json = br#"{"parser_version":"1.0.0","edges":[]}"#.to_vec();
+        s3.put_json_gzip("boms/b.json", json.clone()).await.unwrap();
+
+        let stored = s3.get_object("boms/b.json").await.unwrap();
+        assert!(is_gzip(&stored));
+        assert_eq!(decode_stored(stored.clone()).unwrap(), json);
+        let value: serde_json::Value = from_stored_json(&stored).unwrap();
+        assert_eq!(value["parser_version"], "1.0.0");
+
+        let _ = std::fs::remove_dir_all(root);
+    }
+
+    #[test]
+    fn plain_json_passes_through() {
+        let json = br#"{"a":1}"#.to_vec();
+        assert!(!is_gzip(&json));
+        assert_eq!(decode_stored(json.clone()).unwrap(), json);
+        let value: serde_json::Value = from_stored_json(&json).unwrap();
+        assert_eq!(value["a"], 1);
+    }
+}